@@ -1,12 +1,125 @@
 """File discovery utilities for Python files."""
 
 import os
+import re
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterator, Optional
 
 from pathspec import PathSpec
 from pathspec.patterns.gitwildmatch import GitWildMatchPattern
 
+# Characters that make a gitignore pattern more than a plain basename
+_PATTERN_SPECIAL_CHARS = frozenset("/*?[]!\\")
+
+# Named groups in pathspec's regexes, which can't repeat inside one union
+_NAMED_GROUP_RE = re.compile(r"\(\?P<\w+>")
+
+# Directory scans are I/O-bound, so oversubscribing the cores pays off
+_MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Subdirectories are scanned in parallel only when a directory has more than
+# this many; narrower levels are cheaper to walk sequentially
+_PARALLEL_THRESHOLD = 4
+
+# Always ignored, in addition to custom patterns and the root .gitignore
+_DEFAULT_IGNORE_PATTERNS = [
+    "__pycache__",
+    "*.pyc",
+    ".git",
+    ".venv",
+    "venv",
+    "env",
+    ".env",
+    "node_modules",
+    ".mypy_cache",
+    ".pytest_cache",
+    ".ruff_cache",
+    "dist",
+    "build",
+    "*.egg-info",
+]
+
+# Pyright's built-in excludes (**/node_modules, **/__pycache__, **/.*); it
+# doesn't read .gitignore or apply the list above
+_PYRIGHT_EXCLUDED_NAMES = frozenset({"node_modules", "__pycache__"})
+_PYRIGHT_EXCLUDED_RE = re.compile(r"(?:^|/)\.[^/]+/?$")
+
+
+def _partition_patterns(patterns: list[str]) -> tuple[frozenset[str], list[str]]:
+    """
+    Split ignore patterns into plain basenames and everything else.
+    
+    A pattern without slashes, wildcards or escapes matches any file or
+    directory with exactly that name, so it can be tested with a set lookup
+    instead of a regex. Negated patterns can re-include such names, so when
+    any are present every pattern stays in the PathSpec.
+    
+    Args:
+        patterns: Gitignore-style patterns
+        
+    Returns:
+        Tuple of (basenames, remaining patterns)
+    """
+    if any(pattern.startswith("!") for pattern in patterns):
+        return frozenset(), patterns
+    
+    names = set()
+    residual = []
+    for pattern in patterns:
+        if _PATTERN_SPECIAL_CHARS.isdisjoint(pattern):
+            names.add(pattern)
+        else:
+            residual.append(pattern)
+    
+    return frozenset(names), residual
+
+
+def _pattern_regexes(patterns: list[str]) -> list[str]:
+    """
+    Translate include-only gitignore patterns to regex source strings.
+    
+    Args:
+        patterns: Gitignore-style patterns without negations
+        
+    Returns:
+        Regex sources to search root-relative paths with; most are anchored
+        at the start, but directory-only globs such as "**/" compile to a
+        bare "/" that may match anywhere
+    """
+    regexes = []
+    for pattern in patterns:
+        compiled = GitWildMatchPattern(pattern)
+        if compiled.regex is not None:
+            regexes.append(_NAMED_GROUP_RE.sub("(?:", compiled.regex.pattern))
+    return regexes
+
+
+def _union_matcher(regexes: list[str]) -> Callable[[str], object]:
+    """
+    Compile regex sources into one alternation and return its search method.
+    
+    A single C-level regex replaces PathSpec's Python loop over one regex
+    per pattern. Without negations, a path is ignored when any pattern
+    matches, so the union gives the same result. Like PathSpec it searches
+    rather than matches, since not every pattern regex is anchored.
+    
+    Args:
+        regexes: Regex sources from _pattern_regexes
+        
+    Returns:
+        Callable that is truthy for ignored root-relative paths
+    """
+    if not regexes:
+        return lambda path: None
+    return re.compile("|".join(f"(?:{regex})" for regex in regexes)).search
+
+
+# Compiled once at import; per-call patterns are layered on top
+_DEFAULT_NAME_IGNORES, _DEFAULT_RESIDUAL_PATTERNS = _partition_patterns(_DEFAULT_IGNORE_PATTERNS)
+_DEFAULT_REGEXES = _pattern_regexes(_DEFAULT_RESIDUAL_PATTERNS)
+_DEFAULT_MATCHER = _union_matcher(_DEFAULT_REGEXES)
+
 
 def find_python_files(
     root_dir: str,
@@ -27,54 +140,219 @@ def find_python_files(
     if not root_path.exists():
         raise FileNotFoundError(f"Directory not found: {root_dir}")
     
-    ignore_patterns = [
-        "__pycache__",
-        "*.pyc",
-        ".git",
-        ".venv",
-        "venv",
-        "env",
-        ".env",
-        "node_modules",
-        ".mypy_cache",
-        ".pytest_cache",
-        ".ruff_cache",
-        "dist",
-        "build",
-        "*.egg-info",
-    ]
-    
-    if custom_ignore_patterns:
-        ignore_patterns.extend(custom_ignore_patterns)
-    
-    # Check for .gitignore
-    gitignore_path = root_path / ".gitignore"
-    if gitignore_path.exists():
-        with open(gitignore_path, "r", encoding="utf-8") as f:
+    name_ignores, is_ignored = _load_ignores(root_path, custom_ignore_patterns)
+    
+    return sorted(_walk(str(root_path), name_ignores, is_ignored))
+
+
+def find_pyright_sources(root_dir: str) -> list[str]:
+    """
+    Find the Python files Pyright checks under a directory by default.
+    
+    Only Pyright's own excludes apply (node_modules, __pycache__ and
+    dot-prefixed names). Files hidden by .gitignore or the default ignore
+    list are included, since Pyright still analyzes them.
+    
+    Args:
+        root_dir: Root directory to search
+        
+    Returns:
+        Sorted list of absolute paths to Python files
+    """
+    root_path = Path(root_dir).resolve()
+    
+    if not root_path.exists():
+        raise FileNotFoundError(f"Directory not found: {root_dir}")
+    
+    return sorted(_walk(str(root_path), _PYRIGHT_EXCLUDED_NAMES, _PYRIGHT_EXCLUDED_RE.search))
+
+
+def filter_python_files(
+    root_dir: str,
+    python_files: list[str],
+    custom_ignore_patterns: Optional[list[str]] = None,
+) -> list[str]:
+    """
+    Apply find_python_files' ignore rules to an already-walked file list.
+    
+    Keeps exactly the listed files that find_python_files would return,
+    without scanning the tree again.
+    
+    Args:
+        root_dir: Root directory the files were found under
+        python_files: Absolute paths to Python files under root_dir
+        custom_ignore_patterns: Additional patterns to ignore
+        
+    Returns:
+        The files that are not ignored, in their original order
+    """
+    root_path = Path(root_dir).resolve()
+    name_ignores, is_ignored = _load_ignores(root_path, custom_ignore_patterns)
+    root_len = len(os.path.join(str(root_path), ""))
+    
+    # Every file below a directory shares its verdict, so compute it once
+    dir_ignored: dict[str, bool] = {}
+    
+    def ignored_dir(rel_dir: str) -> bool:
+        ignored = dir_ignored.get(rel_dir)
+        if ignored is None:
+            parent, _, name = rel_dir.rpartition("/")
+            ignored = (
+                name in name_ignores
+                or (bool(parent) and ignored_dir(parent))
+                or bool(is_ignored(rel_dir + "/"))
+            )
+            dir_ignored[rel_dir] = ignored
+        return ignored
+    
+    kept = []
+    for path in python_files:
+        rel_path = path[root_len:]
+        if os.sep != "/":
+            rel_path = rel_path.replace(os.sep, "/")
+        rel_dir, _, name = rel_path.rpartition("/")
+        if name in name_ignores or (rel_dir and ignored_dir(rel_dir)) or is_ignored(rel_path):
+            continue
+        kept.append(path)
+    
+    return kept
+
+
+def _load_ignores(
+    root_path: Path,
+    custom_ignore_patterns: Optional[list[str]],
+) -> tuple[frozenset[str], Callable[[str], object]]:
+    """
+    Compile the ignore rules for a root: defaults, custom patterns and .gitignore.
+    
+    Args:
+        root_path: Resolved root directory
+        custom_ignore_patterns: Additional patterns to ignore
+        
+    Returns:
+        Tuple of (basenames to skip, matcher for the remaining patterns)
+    """
+    ignore_patterns = list(custom_ignore_patterns or [])
+    
+    # Only the root .gitignore is read; nested .gitignore files are not merged
+    try:
+        with open(root_path / ".gitignore", "r", encoding="utf-8") as f:
             gitignore_lines = [
                 line.strip()
                 for line in f
                 if line.strip() and not line.startswith("#")
             ]
             ignore_patterns.extend(gitignore_lines)
+    except FileNotFoundError:
+        pass
     
-    spec = PathSpec.from_lines(GitWildMatchPattern, ignore_patterns)
+    return _compile_ignores(ignore_patterns)
+
+
+def _compile_ignores(
+    extra_patterns: list[str],
+) -> tuple[frozenset[str], Callable[[str], object]]:
+    """
+    Combine the precompiled default ignores with per-call patterns.
     
-    python_files = []
+    Only the extra patterns are translated; the default regexes are reused
+    and joined with them into one union regex. Negated extras may override
+    a default, which a union can't express, so in that case the whole list
+    goes through PathSpec to keep gitignore's last-match-wins ordering.
     
-    for dirpath, dirnames, filenames in os.walk(root_path):
-        # Filter directories to skip
-        dirnames[:] = [
-            d for d in dirnames
-            if not spec.match_file(os.path.join(dirpath, d))
-        ]
+    Args:
+        extra_patterns: Custom and .gitignore patterns, in that order
         
-        for filename in filenames:
-            if filename.endswith((".py", ".pyi")):
-                full_path = os.path.join(dirpath, filename)
-                relative_path = os.path.relpath(full_path, root_path)
+    Returns:
+        Tuple of (basenames to skip, matcher for the remaining patterns)
+    """
+    if not extra_patterns:
+        return _DEFAULT_NAME_IGNORES, _DEFAULT_MATCHER
+    
+    if any(pattern.startswith("!") for pattern in extra_patterns):
+        names, residual = _partition_patterns(_DEFAULT_IGNORE_PATTERNS + extra_patterns)
+        return names, PathSpec.from_lines(GitWildMatchPattern, residual).match_file
+    
+    names, residual = _partition_patterns(extra_patterns)
+    return (
+        _DEFAULT_NAME_IGNORES | names,
+        _union_matcher(_DEFAULT_REGEXES + _pattern_regexes(residual)),
+    )
+
+
+def _walk(
+    root: str,
+    name_ignores: frozenset[str],
+    is_ignored: Callable[[str], object],
+) -> Iterator[str]:
+    """
+    Yield Python files under root that are not ignored.
+    
+    Each directory costs a single scandir call and relies on the cached
+    type information on os.DirEntry objects. Directories are scanned on the
+    calling thread from an explicit stack; when a directory has more than
+    _PARALLEL_THRESHOLD subdirectories, those are handed to a thread pool,
+    since scandir spends most of its time blocked in the kernel.
+    
+    Args:
+        root: Absolute path of the directory to walk
+        name_ignores: Basenames to skip wherever they appear
+        is_ignored: Matcher for the remaining patterns, called with
+            root-relative paths using forward slashes
+        
+    Yields:
+        Absolute paths to Python files
+    """
+    # entry.path always starts with root, so slicing gives the relative path
+    root_len = len(os.path.join(root, ""))
+    
+    # Gitignore regexes expect forward slashes; only pay for the rewrite on
+    # platforms whose separator differs
+    match_file = is_ignored
+    if os.sep != "/":
+        match_file = lambda path: is_ignored(path.replace(os.sep, "/"))  # noqa: E731
+    
+    def scan(path: str) -> tuple[list[str], list[str]]:
+        subdirs: list[str] = []
+        py_files: list[str] = []
+        try:
+            it = os.scandir(path)
+        except OSError:
+            # Unreadable directories are skipped, as os.walk does
+            return subdirs, py_files
+        
+        with it:
+            for entry in it:
+                if entry.name in name_ignores:
+                    continue
                 
-                if not spec.match_file(relative_path):
-                    python_files.append(full_path)
+                if entry.is_dir(follow_symlinks=False):
+                    # Trailing slash lets directory-only patterns match
+                    if not match_file(entry.path[root_len:] + "/"):
+                        subdirs.append(entry.path)
+                # A constant-tuple endswith beats slice comparisons here
+                elif entry.name.endswith((".py", ".pyi")):
+                    if not match_file(entry.path[root_len:]):
+                        py_files.append(entry.path)
+        
+        return subdirs, py_files
     
-    return sorted(python_files)
\ No newline at end of file
+    # Worker threads are only started on the first submit, so small trees
+    # never leave the calling thread
+    with ThreadPoolExecutor(max_workers=_MAX_WORKERS) as pool:
+        stack = [root]
+        pending: set[Future[tuple[list[str], list[str]]]] = set()
+        
+        while stack or pending:
+            if stack:
+                results = [scan(stack.pop())]
+            else:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                results = [future.result() for future in done]
+            
+            for subdirs, py_files in results:
+                yield from py_files
+                if len(subdirs) > _PARALLEL_THRESHOLD:
+                    pending.update(pool.submit(scan, subdir) for subdir in subdirs)
+                else:
+                    stack.extend(subdirs)
@@ -6,7 +6,8 @@ import sys
 
 from .server import mcp
 
-logging.basicConfig(level=logging.INFO)
+# stdout carries the MCP stdio transport, so logs must go to stderr
+logging.basicConfig(stream=sys.stderr, level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
@@ -2,14 +2,51 @@
 
 from typing import Any, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, computed_field, model_validator
+
+
+def _drop_read_only(schema: dict[str, Any]) -> None:
+    """Publish computed fields like the plain fields they replaced."""
+    schema.pop("readOnly", None)
 
 
 class DiagnosticRange(BaseModel):
     """Range in source code."""
 
-    start: dict[str, int]
-    end: dict[str, int]
+    # Stored as flat line/character integers, but published in the tool
+    # schema as the start/end objects that are actually serialized
+    model_config = ConfigDict(json_schema_mode_override="serialization")
+
+    start_line: int = Field(default=0, exclude=True)
+    start_char: int = Field(default=0, exclude=True)
+    end_line: int = Field(default=0, exclude=True)
+    end_char: int = Field(default=0, exclude=True)
+
+    @model_validator(mode="before")
+    @classmethod
+    def _split_positions(cls, data: Any) -> Any:
+        """Accept Pyright-style start/end position dicts."""
+        if isinstance(data, dict) and ("start" in data or "end" in data):
+            data = dict(data)
+            start = data.pop("start", None) or {}
+            end = data.pop("end", None) or {}
+            data.setdefault("start_line", start.get("line", 0))
+            data.setdefault("start_char", start.get("character", 0))
+            data.setdefault("end_line", end.get("line", 0))
+            data.setdefault("end_char", end.get("character", 0))
+        return data
+
+    # Serialized in Pyright's {"line": ..., "character": ...} form. No
+    # docstrings here: they would become schema descriptions.
+    @computed_field(json_schema_extra=_drop_read_only)  # type: ignore[prop-decorator]
+    @property
+    def start(self) -> dict[str, int]:
+        return {"line": self.start_line, "character": self.start_char}
+
+    @computed_field(json_schema_extra=_drop_read_only)  # type: ignore[prop-decorator]
+    @property
+    def end(self) -> dict[str, int]:
+        return {"line": self.end_line, "character": self.end_char}
 
 
 class Diagnostic(BaseModel):
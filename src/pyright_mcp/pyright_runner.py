@@ -1,103 +1,187 @@
 """Pyright execution and output parsing."""
 
-import json
+import asyncio
+import functools
+import logging
+import os
 import shutil
-import subprocess
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Awaitable, Callable, Optional
 
+# orjson parses bytes directly and builds the result much faster than the
+# stdlib; its JSONDecodeError subclasses ValueError
+from orjson import loads as _loads
 
-def execute_pyright(
-    project_path: str,
-    severity: str = "warning",
-    pyright_path: Optional[str] = None,
-) -> dict[str, Any]:
+logger = logging.getLogger(__name__)
+
+# Maximum time a single Pyright run may take
+_TIMEOUT_SECONDS = 300
+
+# Pyright checks files in parallel with --threads; more than a handful of
+# workers mostly adds contention
+_MAX_THREADS = 8
+_THREADS_ARG = f"--threads={min(os.cpu_count() or 1, _MAX_THREADS)}"
+
+StderrLineCallback = Callable[[str], Awaitable[None]]
+
+
+async def _drain_stderr(
+    stream: asyncio.StreamReader,
+    on_stderr_line: Optional[StderrLineCallback],
+) -> bytes:
     """
-    Execute Pyright on a project and return JSON output.
+    Read Pyright's stderr line by line until EOF.
+    
+    Args:
+        stream: The process's stderr stream
+        on_stderr_line: Optional callback for each non-empty decoded line
+        
+    Returns:
+        Everything read from the stream
+    """
+    chunks = []
+    async for line in stream:
+        chunks.append(line)
+        if on_stderr_line is not None:
+            text = line.decode("utf-8", errors="replace").strip()
+            if text:
+                await on_stderr_line(text)
+    return b"".join(chunks)
+
+
+async def _collect_output(
+    process: asyncio.subprocess.Process,
+    on_stderr_line: Optional[StderrLineCallback],
+) -> tuple[bytes, bytes]:
+    """
+    Drain stdout and stderr concurrently, then wait for the process to exit.
+    
+    Both pipes must be read at the same time: Pyright blocks once either
+    pipe buffer fills, and its JSON report easily exceeds that.
+    
+    Args:
+        process: Running Pyright process with piped stdout and stderr
+        on_stderr_line: Optional callback for each stderr line
+        
+    Returns:
+        Tuple of (stdout, stderr)
+    """
+    assert process.stdout is not None and process.stderr is not None
+    stdout, stderr = await asyncio.gather(
+        process.stdout.read(),
+        _drain_stderr(process.stderr, on_stderr_line),
+    )
+    await process.wait()
+    return stdout, stderr
+
+
+@functools.lru_cache(maxsize=None)
+def _resolve_command(pyright_path: Optional[str]) -> tuple[str, ...]:
+    """
+    Find the base command used to invoke Pyright.
+    
+    The executables on PATH don't change while the server runs, so the
+    shutil.which lookups are done once per pyright_path.
     
     Args:
-        project_path: Path to the project to analyze
-        severity: Minimum severity level (error, warning, information)
         pyright_path: Optional custom path to pyright executable
         
     Returns:
-        Parsed JSON output from Pyright
+        Command prefix, before any Pyright arguments
         
     Raises:
-        RuntimeError: If Pyright is not found or execution fails
+        RuntimeError: If Pyright is not found
     """
-    print(f"DEBUG: execute_pyright called with project_path={project_path}, severity={severity}, pyright_path={pyright_path}")
-    # Find pyright executable
-    command: list[str]
     if pyright_path:
-        command = [pyright_path]
-    else:
-        pyright_cmd = shutil.which("pyright")
-        if pyright_cmd:
-            # Use node directly to run pyright script to avoid env issues
-            node_cmd = shutil.which("node")
-            if node_cmd:
-                command = [node_cmd, pyright_cmd]
-            else:
-                command = [pyright_cmd]
-        else:
-            # Try npx as fallback
-            npx_cmd = shutil.which("npx")
-            if npx_cmd:
-                command = [npx_cmd, "pyright"]
-            else:
-                raise RuntimeError(
-                    "Pyright not found. Please install it via 'npm install -g pyright' "
-                    "or 'pip install pyright'"
-                )
+        return (pyright_path,)
     
-    command.extend([
-        project_path,
-        "--outputjson",
-        f"--level={severity}",
-    ])
+    pyright_cmd = shutil.which("pyright")
+    if pyright_cmd:
+        # Use node directly to run pyright script to avoid env issues
+        node_cmd = shutil.which("node")
+        if node_cmd:
+            return (node_cmd, pyright_cmd)
+        return (pyright_cmd,)
     
-    # Check for pyrightconfig.json in project
-    config_path = Path(project_path) / "pyrightconfig.json"
-    if config_path.exists():
-        command.extend(["--project", str(config_path)])
+    # Try npx as fallback
+    npx_cmd = shutil.which("npx")
+    if npx_cmd:
+        return (npx_cmd, "pyright")
     
+    raise RuntimeError(
+        "Pyright not found. Please install it via 'npm install -g pyright' "
+        "or 'pip install pyright'"
+    )
+
+
+async def _run_pyright(
+    command: list[str],
+    cwd: str,
+    on_stderr_line: Optional[StderrLineCallback],
+) -> dict[str, Any]:
+    """
+    Run a Pyright command and parse its JSON report.
+    
+    Args:
+        command: Full Pyright command line, including --outputjson
+        cwd: Working directory for the Pyright process
+        on_stderr_line: Optional callback for each stderr line
+        
+    Returns:
+        Parsed JSON output from Pyright
+        
+    Raises:
+        RuntimeError: If execution fails or times out
+    """
     try:
         # Run Pyright with explicit PATH environment
-        import os
         env = os.environ.copy()
         # Ensure /usr/bin is in PATH for env to find node
         if '/usr/bin' not in env.get('PATH', ''):
             env['PATH'] = f"/usr/bin:{env.get('PATH', '')}"
         
-        # Debug: print the command being executed
-        print(f"DEBUG: Executing command: {command}")
-        print(f"DEBUG: Working directory: {project_path}")
-        print(f"DEBUG: PATH: {env.get('PATH')}")
-            
-        result = subprocess.run(
-            command,
-            capture_output=True,
-            text=True,
-            cwd=project_path,
-            timeout=300,  # 5 minute timeout
+        # stdout is the MCP transport, so diagnostics go through logging
+        logger.debug("Executing %s in %s", command, cwd)
+        
+        # Run as an asyncio subprocess so the event loop stays free for
+        # other MCP requests and progress notifications
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
             env=env,
         )
+        try:
+            stdout, stderr = await asyncio.wait_for(
+                _collect_output(process, on_stderr_line),
+                timeout=_TIMEOUT_SECONDS,
+            )
+        finally:
+            # Don't leave Pyright running in the background after a timeout,
+            # a cancelled tool call or a failing stderr callback; nobody
+            # would drain its pipes and it would block once they fill
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
         
-        # Pyright returns non-zero on errors/warnings, but still produces JSON
-        if result.stdout:
+        # Pyright returns non-zero on errors/warnings, but still produces JSON.
+        # Output is kept as bytes and only decoded for error messages.
+        if stdout:
             try:
-                return json.loads(result.stdout)
-            except json.JSONDecodeError as e:
+                return _loads(stdout)
+            except ValueError as e:
                 # If JSON parsing fails, provide helpful error
                 raise RuntimeError(
                     f"Failed to parse Pyright output: {e}\n"
-                    f"Output: {result.stdout[:500]}"
+                    f"Output: {stdout[:500].decode('utf-8', errors='replace')}"
                 )
         
         # No output usually means no Python files or fatal error
-        if result.stderr:
-            raise RuntimeError(f"Pyright error: {result.stderr}")
+        if stderr:
+            raise RuntimeError(
+                f"Pyright error: {stderr.decode('utf-8', errors='replace')}"
+            )
             
         # Empty project
         return {
@@ -113,7 +197,130 @@ def execute_pyright(
             }
         }
         
-    except subprocess.TimeoutExpired:
+    except asyncio.TimeoutError:
         raise RuntimeError("Pyright execution timed out after 5 minutes")
     except FileNotFoundError:
-        raise RuntimeError(f"Command not found: {command[0]}")
\ No newline at end of file
+        raise RuntimeError(f"Command not found: {command[0]}")
+
+
+async def execute_pyright(
+    project_path: str,
+    severity: str = "error",
+    pyright_path: Optional[str] = None,
+    on_stderr_line: Optional[StderrLineCallback] = None,
+) -> dict[str, Any]:
+    """
+    Execute Pyright on a project and return JSON output.
+    
+    Args:
+        project_path: Path to the project to analyze
+        severity: Minimum severity level (error, warning, information)
+        pyright_path: Optional custom path to pyright executable
+        on_stderr_line: Optional coroutine called with each line Pyright
+            writes to stderr while it runs, e.g. for progress reporting
+        
+    Returns:
+        Parsed JSON output from Pyright
+        
+    Raises:
+        RuntimeError: If Pyright is not found or execution fails
+    """
+    command = [
+        *_resolve_command(pyright_path),
+        project_path,
+        "--outputjson",
+        f"--level={severity}",
+        _THREADS_ARG,
+    ]
+    
+    # Check for pyrightconfig.json in project
+    config_path = Path(project_path) / "pyrightconfig.json"
+    if config_path.exists():
+        command.extend(["--project", str(config_path)])
+    
+    return await _run_pyright(command, project_path, on_stderr_line)
+
+
+async def execute_pyright_batch(
+    project_paths: list[str],
+    severity: str = "error",
+    pyright_path: Optional[str] = None,
+    on_stderr_line: Optional[StderrLineCallback] = None,
+) -> dict[str, dict[str, Any]]:
+    """
+    Execute Pyright once on several projects and split the output by project.
+    
+    Pyright's startup cost is paid once for the whole batch. The process
+    runs from the projects' common parent directory, so per-project
+    pyrightconfig.json files are not passed with --project. This is a
+    library API; no MCP tool calls it.
+    
+    Args:
+        project_paths: Paths to the projects to analyze
+        severity: Minimum severity level (error, warning, information)
+        pyright_path: Optional custom path to pyright executable
+        on_stderr_line: Optional coroutine called with each stderr line
+        
+    Returns:
+        Mapping of each project path to a Pyright-style report holding only
+        that project's diagnostics. Paths naming the same directory share
+        one report. Severity counts in each summary are recomputed per
+        project; filesAnalyzed and timeInSec describe the whole batch run.
+        
+    Raises:
+        RuntimeError: If Pyright is not found or execution fails
+    """
+    if not project_paths:
+        return {}
+    
+    resolved = [os.path.abspath(path) for path in project_paths]
+    # Equivalent spellings of one project ("app", "app/") are checked and
+    # partitioned once, so they can't compete for the same diagnostics
+    roots = list(dict.fromkeys(resolved))
+    
+    command = [
+        *_resolve_command(pyright_path),
+        *roots,
+        "--outputjson",
+        f"--level={severity}",
+        _THREADS_ARG,
+    ]
+    
+    # One file (or paths collapsing to one) has itself as the common path,
+    # which can't serve as the working directory
+    cwd = os.path.commonpath(roots)
+    if os.path.isfile(cwd):
+        cwd = os.path.dirname(cwd)
+    
+    raw_output = await _run_pyright(command, cwd, on_stderr_line)
+    
+    # Nested projects claim their own files, so match the longest path first
+    by_length = sorted(roots, key=len, reverse=True)
+    partitioned: dict[str, list[dict[str, Any]]] = {root: [] for root in roots}
+    
+    for diag in raw_output.get("generalDiagnostics", []):
+        file = diag.get("file")
+        if not file:
+            continue
+        for root in by_length:
+            if file == root or file.startswith(os.path.join(root, "")):
+                partitioned[root].append(diag)
+                break
+    
+    raw_summary = raw_output.get("summary", {})
+    reports = {}
+    for root, diagnostics in partitioned.items():
+        severities = [diag.get("severity", "error") for diag in diagnostics]
+        reports[root] = {
+            "version": raw_output.get("version"),
+            "generalDiagnostics": diagnostics,
+            "summary": {
+                "filesAnalyzed": raw_summary.get("filesAnalyzed", 0),
+                "errorCount": severities.count("error"),
+                "warningCount": severities.count("warning"),
+                "informationCount": severities.count("information"),
+                "timeInSec": raw_summary.get("timeInSec", 0),
+            },
+        }
+    
+    return {path: reports[root] for path, root in zip(project_paths, resolved)}
@@ -1,33 +1,173 @@
 """MCP server implementation for Pyright."""
 
+import asyncio
+import glob
 import logging
+import os
+import re
+import site
+import sys
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Any, Iterable, Iterator, Optional, TypeVar
 
 from mcp.server.fastmcp import Context, FastMCP
 
-from .file_finder import find_python_files
+from .file_finder import filter_python_files, find_pyright_sources, find_python_files
 from .models import Diagnostic, DiagnosticRange, PaginationInfo, PyrightResult, PyrightSummary
 from .pyright_runner import execute_pyright
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging; stdout carries the MCP stdio transport, so use stderr
+logging.basicConfig(stream=sys.stderr, level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 # Create the MCP server
 mcp = FastMCP("Pyright-hand Python Checker")
 
+# Position used when Pyright omits a range endpoint
+_ZERO_POSITION = {"line": 0, "character": 0}
+
+# Pyright's stderr line once source discovery is done, e.g. "Found 12 source files"
+_SOURCE_FILES_RE = re.compile(r"Found (\d+) source files?")
+
+# Minimum seconds between debug messages relaying Pyright's stderr
+_STDERR_FLUSH_INTERVAL = 0.1
+
+
+# Config files in the project root that change what Pyright reports
+_CONFIG_FILES = ("pyrightconfig.json", "pyproject.toml")
+
+# Raw Pyright output per (project, severity, environment), reused while the
+# sources are unchanged; values are (fingerprint, output)
+_RESULT_CACHE_SIZE = 32
+_result_cache: dict[tuple[str, str, tuple[Any, ...]], tuple[int, dict[str, Any]]] = {}
+
+# Project-local virtualenvs Pyright picks up, which the source walk skips
+_LOCAL_SITE_PACKAGES = (".venv/lib/python*/site-packages", ".venv/Lib/site-packages")
+
+
+def _source_fingerprint(root: str, python_files: list[str]) -> Optional[int]:
+    """
+    Summarize the files a Pyright run over root depends on.
+    
+    Every file contributes its path, mtime and size, so adding, removing,
+    renaming or editing any one of them changes the fingerprint, including
+    edits that carry an older mtime (e.g. copies that preserve it).
+    
+    Args:
+        root: Project root passed to Pyright
+        python_files: Sorted Python files Pyright checks under root
+        
+    Returns:
+        Hash of the files' state, or None if a file disappeared while it
+        was being checked
+    """
+    state = []
+    try:
+        for path in python_files:
+            st = os.stat(path)
+            state.append((path, st.st_mtime_ns, st.st_size))
+    except OSError:
+        return None
+    
+    for name in _CONFIG_FILES:
+        path = os.path.join(root, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        state.append((path, st.st_mtime_ns, st.st_size))
+    
+    return hash(tuple(state))
+
+
+def _environment_key(root: str) -> tuple[Any, ...]:
+    """
+    Identify the installed packages Pyright resolves imports against.
+    
+    Installing or removing a package adds or removes entries in its
+    site-packages directory, which changes that directory's mtime. Edits
+    inside an installed package don't, which is what use_cache=False is for.
+    
+    Args:
+        root: Project root passed to Pyright
+        
+    Returns:
+        Hashable tuple of the interpreter prefix and site-packages mtimes
+    """
+    directories = [*site.getsitepackages(), site.getusersitepackages()]
+    for pattern in _LOCAL_SITE_PACKAGES:
+        directories.extend(glob.glob(os.path.join(root, pattern)))
+    
+    state: list[Any] = [sys.prefix]
+    for directory in directories:
+        try:
+            state.append((directory, os.stat(directory).st_mtime_ns))
+        except OSError:
+            continue
+    
+    return tuple(state)
+
+
+def _discover_sources(
+    project_path: str,
+    ignore_patterns: Optional[list[str]],
+) -> tuple[list[str], Optional[int], tuple[Any, ...]]:
+    """
+    Find the files to report and fingerprint what Pyright will check.
+    
+    One walk serves both. Pyright checks gitignored and default-ignored
+    files too, so the fingerprint covers everything outside its own
+    excludes; the reported files apply the usual ignore rules to the same
+    list.
+    
+    Args:
+        project_path: Project root passed to Pyright
+        ignore_patterns: Additional glob patterns to ignore in the report
+        
+    Returns:
+        Tuple of (files to report, source fingerprint or None, environment key)
+    """
+    pyright_files = find_pyright_sources(project_path)
+    fingerprint = _source_fingerprint(project_path, pyright_files)
+    return (
+        filter_python_files(project_path, pyright_files, ignore_patterns),
+        fingerprint,
+        _environment_key(project_path),
+    )
+
+
+def _store_result(
+    key: tuple[str, str, tuple[Any, ...]],
+    fingerprint: int,
+    raw_results: dict[str, Any],
+) -> None:
+    """
+    Remember a Pyright run, evicting the oldest entry when full.
+    
+    Args:
+        key: (project_path, severity, environment) the run was made with
+        fingerprint: Source fingerprint taken before the run
+        raw_results: Raw Pyright JSON output
+    """
+    _result_cache.pop(key, None)
+    if len(_result_cache) >= _RESULT_CACHE_SIZE:
+        del _result_cache[next(iter(_result_cache))]
+    _result_cache[key] = (fingerprint, raw_results)
+
 
 def paginate_diagnostics(
-    diagnostics: list[Diagnostic], 
+    diagnostics: list[T], 
     page: int, 
     page_size: int
-) -> tuple[list[Diagnostic], PaginationInfo]:
+) -> tuple[list[T], PaginationInfo]:
     """
     Paginate diagnostics and return page info.
     
     Args:
-        diagnostics: Full list of diagnostics
+        diagnostics: Full list of diagnostics, as models or raw Pyright entries
         page: Page number (1-based)
         page_size: Number of items per page
         
@@ -58,6 +198,50 @@ def paginate_diagnostics(
     return paginated_diagnostics, pagination_info
 
 
+def _iter_diagnostics(raw_diagnostics: Iterable[dict[str, Any]]) -> Iterator[Diagnostic]:
+    """
+    Build Diagnostic models one at a time from raw Pyright diagnostics.
+
+    Entries without a file association are skipped as they are read.
+
+    Args:
+        raw_diagnostics: Iterable of diagnostics from Pyright JSON
+
+    Yields:
+        Structured Diagnostic models
+    """
+    # Bound locally because this loop runs once per diagnostic
+    make_range = DiagnosticRange.model_construct
+    make_diagnostic = Diagnostic.model_construct
+    zero = _ZERO_POSITION
+
+    for diag in raw_diagnostics:
+        get = diag.get
+
+        # Skip diagnostics without file association
+        file = get("file")
+        if not file:
+            continue
+
+        # Pyright's output is trusted, so skip Pydantic validation
+        raw_range = get("range") or {}
+        start = raw_range.get("start") or zero
+        end = raw_range.get("end") or zero
+
+        yield make_diagnostic(
+            file=file,
+            severity=get("severity", "error"),
+            message=get("message", ""),
+            rule=get("rule"),
+            range=make_range(
+                start_line=start.get("line", 0),
+                start_char=start.get("character", 0),
+                end_line=end.get("line", 0),
+                end_char=end.get("character", 0),
+            ),
+        )
+
+
 def transform_pyright_output(raw_output: dict, page: int = 1, page_size: int = 50) -> PyrightResult:
     """
     Transform raw Pyright JSON output to our structured format.
@@ -80,33 +264,12 @@ def transform_pyright_output(raw_output: dict, page: int = 1, page_size: int = 5
         timeInSec=raw_summary.get("timeInSec", 0.0),
     )
 
-    # Extract diagnostics
-    diagnostics = []
-    for diag in raw_output.get("generalDiagnostics", []):
-        # Skip diagnostics without file association
-        if not diag.get("file"):
-            continue
-
-        # Parse range
-        raw_range = diag.get("range", {})
-        diagnostic_range = DiagnosticRange(
-            start=raw_range.get("start", {"line": 0, "character": 0}),
-            end=raw_range.get("end", {"line": 0, "character": 0}),
-        )
-
-        # Create diagnostic
-        diagnostics.append(
-            Diagnostic(
-                file=diag["file"],
-                severity=diag.get("severity", "error"),
-                message=diag.get("message", ""),
-                rule=diag.get("rule"),
-                range=diagnostic_range,
-            )
-        )
-
-    # Apply pagination
-    paginated_diagnostics, pagination_info = paginate_diagnostics(diagnostics, page, page_size)
+    # Paginate the raw entries so models are only built for the requested page
+    raw_diagnostics = [
+        diag for diag in raw_output.get("generalDiagnostics") or () if diag.get("file")
+    ]
+    page_entries, pagination_info = paginate_diagnostics(raw_diagnostics, page, page_size)
+    paginated_diagnostics = list(_iter_diagnostics(page_entries))
     
     return PyrightResult(
         summary=summary,
@@ -119,10 +282,11 @@ def transform_pyright_output(raw_output: dict, page: int = 1, page_size: int = 5
 @mcp.tool()
 async def check_python_types(
     ctx: Context,
-    severity_level: str = "warning",
+    severity_level: str = "error",
     ignore_patterns: Optional[list[str]] = None,
     page: int = 1,
     page_size: int = 50,
+    use_cache: bool = True,
 ) -> PyrightResult:
     """
     Run Pyright type checking on Python files in /app/code.
@@ -132,10 +296,14 @@ async def check_python_types(
     type-related issues.
 
     Args:
-        severity_level: Minimum severity to report (error, warning, information)
+        severity_level: Minimum severity to report (error, warning, information;
+            default error)
         ignore_patterns: Additional glob patterns to ignore
         page: Page number for pagination (starts at 1)
         page_size: Number of diagnostics per page (default 50)
+        use_cache: Reuse the previous results when no checked file or
+            installed package changed (default true); pass false to force
+            a fresh run
         ctx: MCP context for progress reporting
 
     Returns:
@@ -152,14 +320,79 @@ async def check_python_types(
 
         project_path = str(target_path)
 
-        # Find Python files for progress reporting
+        # Walking and stat-ing a large tree would stall every other request
+        # on the stdio transport, so it runs on a worker thread
         await ctx.debug("Discovering Python files...")
-        python_files = find_python_files(project_path, ignore_patterns)
+        python_files, fingerprint, environment = await asyncio.to_thread(
+            _discover_sources, project_path, ignore_patterns
+        )
         await ctx.info(f"Found {len(python_files)} Python files to analyze")
 
-        # Run Pyright
-        await ctx.report_progress(0.3, 1.0, "Running Pyright analysis...")
-        raw_results = execute_pyright(project_path, severity_level)
+        pending_lines: list[str] = []
+        last_flush = float("-inf")
+        flush_timer: Optional[asyncio.Task[None]] = None
+        timer_errors: list[Exception] = []
+
+        async def flush_pyright_output() -> None:
+            nonlocal last_flush, flush_timer
+            if flush_timer is not None and flush_timer is not asyncio.current_task():
+                flush_timer.cancel()
+            flush_timer = None
+            if pending_lines:
+                message = "\n".join(pending_lines)
+                pending_lines.clear()
+                await ctx.debug(message)
+            last_flush = time.monotonic()
+
+        async def flush_later(delay: float) -> None:
+            await asyncio.sleep(delay)
+            try:
+                await flush_pyright_output()
+            except Exception as e:
+                # Nothing awaits the timer, so hand the failure (e.g. a
+                # disconnected client) to the relay or the final flush
+                timer_errors.append(e)
+
+        async def report_pyright_output(line: str) -> None:
+            nonlocal flush_timer
+            if timer_errors:
+                raise timer_errors[0]
+            # Pyright has no per-file progress; surface discovery as a step
+            if _SOURCE_FILES_RE.search(line):
+                await flush_pyright_output()
+                await ctx.report_progress(0.4, 1.0, line)
+                return
+            # Verbose runs print a line per file, so send one message per
+            # interval rather than one per line
+            pending_lines.append(line)
+            elapsed = time.monotonic() - last_flush
+            if elapsed >= _STDERR_FLUSH_INTERVAL:
+                await flush_pyright_output()
+            elif flush_timer is None:
+                # Pyright often goes quiet for the whole analysis after its
+                # setup lines, so don't wait for the next line to send them
+                flush_timer = asyncio.create_task(flush_later(_STDERR_FLUSH_INTERVAL - elapsed))
+
+        cache_key = (project_path, severity_level, environment)
+        cached = _result_cache.get(cache_key) if use_cache else None
+        if fingerprint is not None and cached is not None and cached[0] == fingerprint:
+            await ctx.report_progress(0.3, 1.0, "No changes since last run, reusing Pyright results")
+            raw_results = cached[1]
+        else:
+            # Run Pyright
+            await ctx.report_progress(0.3, 1.0, "Running Pyright analysis...")
+            try:
+                raw_results = await execute_pyright(
+                    project_path,
+                    severity_level,
+                    on_stderr_line=report_pyright_output,
+                )
+            finally:
+                await flush_pyright_output()
+                if timer_errors:
+                    raise timer_errors[0]
+            if fingerprint is not None:
+                _store_result(cache_key, fingerprint, raw_results)
 
         # Transform results
         await ctx.report_progress(0.8, 1.0, "Processing results...")
@@ -0,0 +1,49 @@
+"""Shared test helpers."""
+
+from dataclasses import dataclass
+from pathlib import Path
+
+import orjson
+import pytest
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+
+@dataclass(slots=True)
+class FakePath:
+    """Lightweight stand-in for pathlib.Path in server tests."""
+
+    path: str
+    _exists: bool = True
+
+    def resolve(self) -> "FakePath":
+        return self
+
+    def exists(self) -> bool:
+        return self._exists
+
+    def __str__(self) -> str:
+        return self.path
+
+
+@pytest.fixture
+def make_path(monkeypatch):
+    """Point pyright_mcp.server.Path at a FakePath that may not exist."""
+
+    def _make(exists=True):
+        monkeypatch.setattr(
+            "pyright_mcp.server.Path",
+            lambda path: FakePath(path, exists),
+        )
+
+    return _make
+
+
+@pytest.fixture(scope="session")
+def complete_raw() -> dict:
+    """Full Pyright JSON report, parsed once per session.
+
+    transform_pyright_output only reads its input, so the shared dict is
+    safe to hand to every test without copying.
+    """
+    return orjson.loads((FIXTURES_DIR / "complete_pyright_output.json").read_bytes())
@@ -6,7 +6,7 @@ from pathlib import Path
 
 import pytest
 
-from pyright_mcp.file_finder import find_python_files
+from pyright_mcp.file_finder import filter_python_files, find_pyright_sources, find_python_files
 
 
 class TestFileFinder:
@@ -94,4 +94,157 @@ class TestFileFinder:
             
             files = find_python_files(tmpdir)
             assert len(files) == 1
-            assert files[0].endswith("single.py")
\ No newline at end of file
+            assert files[0].endswith("single.py")
+    
+    def test_find_python_files_nested_name_ignore(self, temp_project):
+        """Test plain-name patterns apply at any depth."""
+        nested = temp_project / "src" / "build"
+        nested.mkdir()
+        (nested / "generated.py").write_text("# Should be ignored")
+        
+        files = find_python_files(str(temp_project))
+        
+        assert not any(f.endswith("generated.py") for f in files)
+    
+    def test_find_python_files_negated_pattern(self, temp_project):
+        """Test negated patterns re-include default-ignored names."""
+        build = temp_project / "build"
+        build.mkdir()
+        (build / "keep.py").write_text("x = 1")
+        
+        files = find_python_files(
+            str(temp_project),
+            custom_ignore_patterns=["!build"]
+        )
+        
+        relative_files = [
+            Path(f).relative_to(Path(temp_project).resolve()).as_posix()
+            for f in files
+        ]
+        
+        assert "build/keep.py" in relative_files
+        assert "venv/lib.py" not in relative_files
+    
+    def test_find_python_files_root_inside_ignored_name(self):
+        """Test patterns only apply below the root, not to its parents."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir) / "build" / "project"
+            (root / "pkg").mkdir(parents=True)
+            (root / "pkg" / "mod.py").write_text("x = 1")
+            (root / "dist").mkdir()
+            (root / "dist" / "bundled.py").write_text("# Should be ignored")
+            
+            files = find_python_files(str(root), custom_ignore_patterns=["/pkg/skip.py"])
+            
+            relative_files = [
+                Path(f).relative_to(root.resolve()).as_posix()
+                for f in files
+            ]
+            assert relative_files == ["pkg/mod.py"]
+    
+    def test_find_python_files_anchored_pattern(self, temp_project):
+        """Test anchored patterns match against the root-relative path."""
+        (temp_project / "src" / "main.py").write_text("print('nested')")
+        
+        files = find_python_files(
+            str(temp_project),
+            custom_ignore_patterns=["/main.py"]
+        )
+        
+        relative_files = [
+            Path(f).relative_to(Path(temp_project).resolve()).as_posix()
+            for f in files
+        ]
+        
+        assert "main.py" not in relative_files
+        assert "src/main.py" in relative_files
+    
+    def test_find_python_files_glob_patterns(self, temp_project):
+        """Test wildcard directory and double-star patterns."""
+        generated = temp_project / "generated_api"
+        generated.mkdir()
+        (generated / "client.py").write_text("# Should be ignored")
+        fixtures = temp_project / "src" / "tests" / "fixtures"
+        fixtures.mkdir(parents=True)
+        (fixtures / "sample.py").write_text("# Should be ignored")
+        (temp_project / "src" / "tests" / "test_module.py").write_text("x = 1")
+        
+        files = find_python_files(
+            str(temp_project),
+            custom_ignore_patterns=["generated_*/", "**/fixtures/*.py"]
+        )
+        
+        relative_files = [
+            Path(f).relative_to(Path(temp_project).resolve()).as_posix()
+            for f in files
+        ]
+        
+        assert "src/tests/test_module.py" in relative_files
+        assert "generated_api/client.py" not in relative_files
+        assert "src/tests/fixtures/sample.py" not in relative_files
+        
+        # "**/" has no start anchor and ignores every directory
+        files = find_python_files(str(temp_project), custom_ignore_patterns=["**/"])
+        
+        assert [Path(f).name for f in files] == ["main.py", "utils.py"]
+    
+    def test_find_python_files_wide_tree(self):
+        """Test a tree wide enough to be scanned in parallel."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir)
+            expected = []
+            for i in range(10):
+                package = root / f"pkg{i}"
+                for j in range(6):
+                    subdir = package / f"sub{j}"
+                    subdir.mkdir(parents=True)
+                    (subdir / "mod.py").write_text("x = 1")
+                    expected.append(f"pkg{i}/sub{j}/mod.py")
+            
+            files = find_python_files(tmpdir)
+            
+            relative_files = [
+                Path(f).relative_to(root.resolve()).as_posix()
+                for f in files
+            ]
+            assert relative_files == sorted(expected)
+    
+    def test_find_pyright_sources(self, temp_project):
+        """Test only Pyright's own excludes apply, not the default or .gitignore lists."""
+        for directory in ["node_modules", ".hidden", "build"]:
+            (temp_project / directory).mkdir()
+            (temp_project / directory / "mod.py").write_text("x = 1")
+        
+        files = find_pyright_sources(str(temp_project))
+        
+        relative_files = [
+            Path(f).relative_to(Path(temp_project).resolve()).as_posix()
+            for f in files
+        ]
+        assert relative_files == [
+            "build/mod.py",
+            "main.py",
+            "src/module.py",
+            "src/types.pyi",
+            "temp/temp.py",
+            "utils.py",
+            "venv/lib.py",
+        ]
+    
+    @pytest.mark.parametrize(
+        "custom_ignore_patterns",
+        [None, ["src/"], ["*.pyi", "utils.py"], ["!build"], ["/main.py", "**/deep/"]],
+    )
+    def test_filter_python_files_matches_walk(self, temp_project, custom_ignore_patterns):
+        """Test filtering a walked list gives the same files as find_python_files."""
+        (temp_project / "build" / "deep").mkdir(parents=True)
+        (temp_project / "build" / "keep.py").write_text("x = 1")
+        (temp_project / "build" / "deep" / "mod.py").write_text("x = 1")
+        (temp_project / "src" / "deep").mkdir()
+        (temp_project / "src" / "deep" / "mod.py").write_text("x = 1")
+        
+        walked = find_pyright_sources(str(temp_project))
+        
+        assert filter_python_files(
+            str(temp_project), walked, custom_ignore_patterns
+        ) == find_python_files(str(temp_project), custom_ignore_patterns)
@@ -1,82 +1,136 @@
 """Tests for Pyright runner functionality."""
 
+import asyncio
 import json
-import subprocess
-from unittest.mock import MagicMock, patch
+import sys
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 
-from pyright_mcp.pyright_runner import execute_pyright
+from pyright_mcp.pyright_runner import (
+    _resolve_command,
+    _run_pyright,
+    execute_pyright,
+    execute_pyright_batch,
+)
+
+_EXPECTED_OUTPUT = {
+    "version": "1.1.300",
+    "time": "1.5",
+    "generalDiagnostics": [
+        {
+            "file": "test.py",
+            "severity": "error",
+            "message": "Type error",
+            "rule": "reportGeneralTypeIssues",
+            "range": {
+                "start": {"line": 10, "character": 5},
+                "end": {"line": 10, "character": 15}
+            }
+        }
+    ],
+    "summary": {
+        "filesAnalyzed": 1,
+        "errorCount": 1,
+        "warningCount": 0,
+        "informationCount": 0,
+        "timeInSec": 1.5
+    }
+}
+_EXPECTED_JSON = json.dumps(_EXPECTED_OUTPUT).encode()
+# Stands in for Pyright's JSON in tests that stub out the parser
+_UNPARSED_STDOUT = b"{}"
+
+
+@pytest.fixture(autouse=True)
+def clear_command_cache():
+    """Keep memoized command lookups from leaking between tests."""
+    _resolve_command.cache_clear()
+    yield
+    _resolve_command.cache_clear()
+
+
+@pytest.fixture
+def pyright_mocks(monkeypatch):
+    """Replace PATH lookup and process creation in the runner."""
+    mock_exec = AsyncMock()
+    mock_which = MagicMock(return_value="/usr/bin/pyright")
+    monkeypatch.setattr("pyright_mcp.pyright_runner.asyncio.create_subprocess_exec", mock_exec)
+    monkeypatch.setattr("pyright_mcp.pyright_runner.shutil.which", mock_which)
+    return SimpleNamespace(exec=mock_exec, which=mock_which)
+
+
+@pytest.fixture
+def stub_parser(monkeypatch):
+    """Skip JSON parsing in tests that only care about how Pyright is run."""
+    parsed = {"summary": {"filesAnalyzed": 0}, "generalDiagnostics": []}
+    monkeypatch.setattr("pyright_mcp.pyright_runner._loads", lambda data: parsed)
+    return parsed
+
+
+def make_stream(data=b"", eof=True):
+    """Create a stream reader preloaded with data."""
+    stream = asyncio.StreamReader()
+    stream.feed_data(data)
+    if eof:
+        stream.feed_eof()
+    return stream
+
+
+def make_process(stdout=b"", stderr=b"", finished=True):
+    """Create a fake asyncio subprocess with the given output."""
+    return SimpleNamespace(
+        stdout=make_stream(stdout, eof=finished),
+        stderr=make_stream(stderr, eof=finished),
+        wait=AsyncMock(return_value=0),
+        kill=MagicMock(),
+        returncode=0 if finished else None,
+    )
 
 
 class TestPyrightRunner:
     """Test Pyright execution functionality."""
-    
-    @patch("pyright_mcp.pyright_runner.subprocess.run")
-    @patch("pyright_mcp.pyright_runner.shutil.which")
-    def test_execute_pyright_success(self, mock_which, mock_run):
+
+    async def test_execute_pyright_success(self, pyright_mocks):
         """Test successful Pyright execution."""
-        mock_which.return_value = "/usr/bin/pyright"
-        
-        expected_output = {
-            "version": "1.1.300",
-            "time": "1.5",
-            "generalDiagnostics": [
-                {
-                    "file": "test.py",
-                    "severity": "error",
-                    "message": "Type error",
-                    "rule": "reportGeneralTypeIssues",
-                    "range": {
-                        "start": {"line": 10, "character": 5},
-                        "end": {"line": 10, "character": 15}
-                    }
-                }
-            ],
-            "summary": {
-                "filesAnalyzed": 1,
-                "errorCount": 1,
-                "warningCount": 0,
-                "informationCount": 0,
-                "timeInSec": 1.5
-            }
-        }
-        
-        mock_result = MagicMock()
-        mock_result.stdout = json.dumps(expected_output)
-        mock_result.stderr = ""
-        mock_run.return_value = mock_result
-        
-        result = execute_pyright("/path/to/project")
-        
-        assert result == expected_output
-        mock_run.assert_called_once()
-        
+        pyright_mocks.exec.return_value = make_process(
+            stdout=_EXPECTED_JSON,
+            stderr=b"",
+        )
+
+        result = await execute_pyright("/path/to/project")
+
+        assert result == _EXPECTED_OUTPUT
+        pyright_mocks.exec.assert_called_once()
+
         # Check command
-        call_args = mock_run.call_args[0][0]
+        call_args = pyright_mocks.exec.call_args.args
         assert call_args[0] == "/usr/bin/pyright"
         assert "/path/to/project" in call_args
         assert "--outputjson" in call_args
-        assert "--level=warning" in call_args
-    
-    @patch("pyright_mcp.pyright_runner.subprocess.run")
-    @patch("pyright_mcp.pyright_runner.shutil.which")
-    def test_execute_pyright_custom_severity(self, mock_which, mock_run):
-        """Test Pyright with custom severity level."""
-        mock_which.return_value = "/usr/bin/pyright"
-        
-        mock_result = MagicMock()
-        mock_result.stdout = json.dumps({"summary": {}})
-        mock_run.return_value = mock_result
-        
-        execute_pyright("/path", severity="error")
-        
-        call_args = mock_run.call_args[0][0]
         assert "--level=error" in call_args
-    
-    @patch("pyright_mcp.pyright_runner.subprocess.run")
-    @patch("pyright_mcp.pyright_runner.shutil.which")
-    def test_execute_pyright_npx_fallback(self, mock_which, mock_run):
+        assert any(arg.startswith("--threads=") for arg in call_args)
+        assert pyright_mocks.exec.call_args.kwargs["cwd"] == "/path/to/project"
+
+    async def test_execute_pyright_keeps_stdout_clean(self, pyright_mocks, stub_parser, capsys):
+        """Test nothing is written to stdout, which carries the MCP transport."""
+        pyright_mocks.exec.return_value = make_process(stdout=_UNPARSED_STDOUT)
+
+        await execute_pyright("/path")
+
+        assert capsys.readouterr().out == ""
+
+    async def test_execute_pyright_custom_severity(self, pyright_mocks, stub_parser):
+        """Test Pyright with custom severity level."""
+        pyright_mocks.exec.return_value = make_process(stdout=_UNPARSED_STDOUT)
+
+        await execute_pyright("/path", severity="warning")
+
+        call_args = pyright_mocks.exec.call_args.args
+        assert "--level=warning" in call_args
+
+    async def test_execute_pyright_npx_fallback(self, pyright_mocks, stub_parser):
         """Test falling back to npx when pyright not found."""
         def which_side_effect(cmd):
             if cmd == "pyright":
@@ -84,62 +138,243 @@ class TestPyrightRunner:
             if cmd == "npx":
                 return "/usr/bin/npx"
             return None
-        
-        mock_which.side_effect = which_side_effect
-        
-        mock_result = MagicMock()
-        mock_result.stdout = json.dumps({"summary": {}})
-        mock_run.return_value = mock_result
-        
-        execute_pyright("/path")
-        
-        call_args = mock_run.call_args[0][0]
+
+        pyright_mocks.which.side_effect = which_side_effect
+
+        pyright_mocks.exec.return_value = make_process(stdout=_UNPARSED_STDOUT)
+
+        await execute_pyright("/path")
+
+        call_args = pyright_mocks.exec.call_args.args
         assert call_args[0] == "/usr/bin/npx"
         assert call_args[1] == "pyright"
-    
-    @patch("pyright_mcp.pyright_runner.shutil.which")
-    def test_execute_pyright_not_found(self, mock_which):
+
+    async def test_execute_pyright_not_found(self, pyright_mocks):
         """Test error when Pyright is not found."""
-        mock_which.return_value = None
-        
+        pyright_mocks.which.return_value = None
+
         with pytest.raises(RuntimeError, match="Pyright not found"):
-            execute_pyright("/path")
-    
-    @patch("pyright_mcp.pyright_runner.subprocess.run")
-    @patch("pyright_mcp.pyright_runner.shutil.which")
-    def test_execute_pyright_invalid_json(self, mock_which, mock_run):
+            await execute_pyright("/path")
+
+    async def test_execute_pyright_invalid_json(self, pyright_mocks):
         """Test handling of invalid JSON output."""
-        mock_which.return_value = "/usr/bin/pyright"
-        
-        mock_result = MagicMock()
-        mock_result.stdout = "Invalid JSON {{"
-        mock_run.return_value = mock_result
-        
+        pyright_mocks.exec.return_value = make_process(stdout=b"Invalid JSON {{")
+
         with pytest.raises(RuntimeError, match="Failed to parse Pyright output"):
-            execute_pyright("/path")
-    
-    @patch("pyright_mcp.pyright_runner.subprocess.run")
-    @patch("pyright_mcp.pyright_runner.shutil.which")
-    def test_execute_pyright_timeout(self, mock_which, mock_run):
+            await execute_pyright("/path")
+
+    async def test_execute_pyright_non_ascii_output(self, pyright_mocks):
+        """Test raw UTF-8 output is parsed without a separate decode."""
+        expected_output = {
+            "generalDiagnostics": [
+                {"file": "/path/ünïcode.py", "severity": "error", "message": "“quoted” → type"}
+            ],
+            "summary": {},
+        }
+        pyright_mocks.exec.return_value = make_process(
+            stdout=json.dumps(expected_output, ensure_ascii=False).encode("utf-8")
+        )
+
+        result = await execute_pyright("/path")
+
+        assert result == expected_output
+
+    async def test_execute_pyright_invalid_json_truncated_utf8(self, pyright_mocks):
+        """Test the error excerpt tolerates a multi-byte character cut in half."""
+        # 500-byte excerpt ends in the middle of a two-byte character
+        pyright_mocks.exec.return_value = make_process(stdout=("x" + "é" * 300).encode("utf-8"))
+
+        with pytest.raises(RuntimeError, match="Failed to parse Pyright output"):
+            await execute_pyright("/path")
+
+    async def test_execute_pyright_timeout(self, pyright_mocks, monkeypatch):
         """Test timeout handling."""
-        mock_which.return_value = "/usr/bin/pyright"
-        mock_run.side_effect = subprocess.TimeoutExpired(["pyright"], 300)
-        
+        monkeypatch.setattr("pyright_mcp.pyright_runner._TIMEOUT_SECONDS", 0.01)
+        process = make_process(finished=False)
+        pyright_mocks.exec.return_value = process
+
         with pytest.raises(RuntimeError, match="timed out"):
-            execute_pyright("/path")
-    
-    @patch("pyright_mcp.pyright_runner.subprocess.run")
-    @patch("pyright_mcp.pyright_runner.shutil.which")
-    def test_execute_pyright_empty_project(self, mock_which, mock_run):
+            await execute_pyright("/path")
+
+        process.kill.assert_called_once()
+
+    async def test_execute_pyright_failing_callback_kills_process(self, pyright_mocks):
+        """Test Pyright is killed when relaying its output fails."""
+        process = SimpleNamespace(
+            stdout=make_stream(),
+            stderr=make_stream(b"Searching for source files\n"),
+            wait=AsyncMock(return_value=0),
+            kill=MagicMock(),
+            returncode=None,
+        )
+        pyright_mocks.exec.return_value = process
+
+        async def on_stderr_line(line):
+            raise ConnectionError("client went away")
+
+        with pytest.raises(ConnectionError):
+            await execute_pyright("/path", on_stderr_line=on_stderr_line)
+
+        process.kill.assert_called_once()
+
+    async def test_execute_pyright_empty_project(self, pyright_mocks):
         """Test handling of empty project."""
-        mock_which.return_value = "/usr/bin/pyright"
-        
-        mock_result = MagicMock()
-        mock_result.stdout = ""
-        mock_result.stderr = ""
-        mock_run.return_value = mock_result
-        
-        result = execute_pyright("/path")
-        
+        pyright_mocks.exec.return_value = make_process(stdout=b"", stderr=b"")
+
+        result = await execute_pyright("/path")
+
         assert result["generalDiagnostics"] == []
-        assert result["summary"]["filesAnalyzed"] == 0
\ No newline at end of file
+        assert result["summary"]["filesAnalyzed"] == 0
+
+    async def test_execute_pyright_stderr_lines(self, pyright_mocks, stub_parser):
+        """Test stderr lines are streamed to the callback."""
+        pyright_mocks.exec.return_value = make_process(
+            stdout=_UNPARSED_STDOUT,
+            stderr=b"No configuration file found.\n\nFound 3 source files\n",
+        )
+        lines = []
+
+        async def on_stderr_line(line):
+            lines.append(line)
+
+        await execute_pyright("/path", on_stderr_line=on_stderr_line)
+
+        assert lines == ["No configuration file found.", "Found 3 source files"]
+
+    async def test_execute_pyright_stderr_only(self, pyright_mocks):
+        """Test stderr is reported when Pyright produces no JSON."""
+        pyright_mocks.exec.return_value = make_process(stderr=b"Fatal error\n")
+
+        with pytest.raises(RuntimeError, match="Pyright error: Fatal error"):
+            await execute_pyright("/path")
+
+    async def test_execute_pyright_caches_command_lookup(self, pyright_mocks, stub_parser):
+        """Test executables are looked up on PATH only once."""
+        pyright_mocks.exec.side_effect = lambda *args, **kwargs: make_process(stdout=_UNPARSED_STDOUT)
+
+        await execute_pyright("/path")
+        await execute_pyright("/other")
+
+        # pyright + node on the first call, nothing on the second
+        assert pyright_mocks.which.call_count == 2
+        assert "/other" in pyright_mocks.exec.call_args.args
+
+    async def test_execute_pyright_batch(self, pyright_mocks):
+        """Test one Pyright run is split across several projects."""
+        batch_output = {
+            "version": "1.1.300",
+            "generalDiagnostics": [
+                {"file": "/repo/app/main.py", "severity": "error", "message": "A"},
+                {"file": "/repo/app/plugins/x.py", "severity": "warning", "message": "B"},
+                {"file": "/repo/lib/util.py", "severity": "error", "message": "C"},
+                {"file": "/repo/library/other.py", "severity": "error", "message": "D"},
+            ],
+            "summary": {"filesAnalyzed": 9, "timeInSec": 2.0},
+        }
+        pyright_mocks.exec.return_value = make_process(
+            stdout=json.dumps(batch_output).encode()
+        )
+
+        results = await execute_pyright_batch(
+            ["/repo/app", "/repo/app/plugins", "/repo/lib"]
+        )
+
+        pyright_mocks.exec.assert_called_once()
+        call_args = pyright_mocks.exec.call_args.args
+        assert "/repo/app" in call_args
+        assert "/repo/lib" in call_args
+        assert any(arg.startswith("--threads=") for arg in call_args)
+        assert pyright_mocks.exec.call_args.kwargs["cwd"] == "/repo"
+
+        assert [d["message"] for d in results["/repo/app"]["generalDiagnostics"]] == ["A"]
+        assert [d["message"] for d in results["/repo/app/plugins"]["generalDiagnostics"]] == ["B"]
+        assert [d["message"] for d in results["/repo/lib"]["generalDiagnostics"]] == ["C"]
+        assert results["/repo/app/plugins"]["summary"]["warningCount"] == 1
+        assert results["/repo/lib"]["summary"]["errorCount"] == 1
+        assert results["/repo/lib"]["summary"]["filesAnalyzed"] == 9
+
+    async def test_execute_pyright_batch_duplicate_paths(self, pyright_mocks):
+        """Test repeated or equivalent paths all get the project's diagnostics."""
+        pyright_mocks.exec.return_value = make_process(
+            stdout=json.dumps({
+                "generalDiagnostics": [
+                    {"file": "/repo/app/main.py", "severity": "error", "message": "A"},
+                ],
+                "summary": {},
+            }).encode()
+        )
+
+        results = await execute_pyright_batch(["/repo/app", "/repo/app/", "/repo/app"])
+
+        call_args = pyright_mocks.exec.call_args.args
+        assert call_args.count("/repo/app") == 1
+        assert set(results) == {"/repo/app", "/repo/app/"}
+        for report in results.values():
+            assert [d["message"] for d in report["generalDiagnostics"]] == ["A"]
+            assert report["summary"]["errorCount"] == 1
+
+    async def test_execute_pyright_batch_single_file(self, pyright_mocks, tmp_path):
+        """Test a one-file batch runs from the file's directory."""
+        source = tmp_path / "main.py"
+        source.write_text("x: int = 1\n")
+        pyright_mocks.exec.return_value = make_process(
+            stdout=json.dumps({
+                "generalDiagnostics": [
+                    {"file": str(source), "severity": "error", "message": "A"},
+                ],
+                "summary": {},
+            }).encode()
+        )
+
+        results = await execute_pyright_batch([str(source), str(source)])
+
+        assert pyright_mocks.exec.call_args.kwargs["cwd"] == str(tmp_path)
+        assert [d["message"] for d in results[str(source)]["generalDiagnostics"]] == ["A"]
+
+    async def test_run_pyright_large_output_does_not_block(self, tmp_path):
+        """Test multi-megabyte stdout and chatty stderr are drained together."""
+        # Writes far more than a pipe buffer to both streams, interleaved
+        script = (
+            "import json, sys\n"
+            "for i in range(2000):\n"
+            "    print(f'progress {i}', file=sys.stderr)\n"
+            "diags = [{'file': f'/f{i}.py', 'severity': 'error', 'message': 'x' * 100}"
+            " for i in range(20000)]\n"
+            "sys.stdout.write(json.dumps({'generalDiagnostics': diags, 'summary': {}}))\n"
+        )
+        lines = []
+
+        async def on_stderr_line(line):
+            lines.append(line)
+
+        result = await asyncio.wait_for(
+            _run_pyright([sys.executable, "-c", script], str(tmp_path), on_stderr_line),
+            timeout=30,
+        )
+
+        assert len(result["generalDiagnostics"]) == 20000
+        assert len(lines) == 2000
+
+    async def test_run_pyright_cancel_kills_process(self, tmp_path, monkeypatch):
+        """Test cancelling a run kills the child instead of orphaning it."""
+        spawned = []
+        create_subprocess_exec = asyncio.create_subprocess_exec
+
+        async def spawn(*args, **kwargs):
+            process = await create_subprocess_exec(*args, **kwargs)
+            spawned.append(process)
+            return process
+
+        monkeypatch.setattr("pyright_mcp.pyright_runner.asyncio.create_subprocess_exec", spawn)
+
+        task = asyncio.create_task(
+            _run_pyright([sys.executable, "-c", "import time; time.sleep(60)"], str(tmp_path), None)
+        )
+        while not spawned:
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert spawned[0].returncode is not None
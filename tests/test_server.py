@@ -1,53 +1,50 @@
 """Tests for MCP server functionality."""
 
-from unittest.mock import AsyncMock, MagicMock, patch
+import asyncio
+import os
+import threading
+from unittest.mock import AsyncMock, patch
 
 import pytest
 
-from pyright_mcp.models import PyrightResult
-from pyright_mcp.server import check_python_types, list_python_files, paginate_diagnostics, transform_pyright_output
+from pyright_mcp.models import Diagnostic, DiagnosticRange, PyrightResult
+from pyright_mcp.server import (
+    _result_cache,
+    check_python_types,
+    list_python_files,
+    mcp,
+    paginate_diagnostics,
+    transform_pyright_output,
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_result_cache():
+    """Keep cached Pyright results from leaking between tests."""
+    _result_cache.clear()
+    yield
+    _result_cache.clear()
+
+
+@pytest.fixture
+def project_dir(tmp_path, monkeypatch):
+    """Point the tools' /app/code at a real temporary project."""
+    monkeypatch.setattr("pyright_mcp.server.Path", lambda path: tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def ctx():
+    """MCP context double for tool calls."""
+    return AsyncMock()
 
 
 class TestServerTransform:
     """Test output transformation."""
     
-    def test_transform_pyright_output_complete(self):
+    def test_transform_pyright_output_complete(self, complete_raw):
         """Test transformation of complete Pyright output."""
-        raw_output = {
-            "version": "1.1.300",
-            "time": "2.5",
-            "generalDiagnostics": [
-                {
-                    "file": "/path/to/file.py",
-                    "severity": "error",
-                    "message": "Type mismatch",
-                    "rule": "reportGeneralTypeIssues",
-                    "range": {
-                        "start": {"line": 10, "character": 5},
-                        "end": {"line": 10, "character": 15}
-                    }
-                },
-                {
-                    "file": "/path/to/other.py",
-                    "severity": "warning",
-                    "message": "Variable unused",
-                    "rule": "reportUnusedVariable",
-                    "range": {
-                        "start": {"line": 20, "character": 0},
-                        "end": {"line": 20, "character": 10}
-                    }
-                }
-            ],
-            "summary": {
-                "filesAnalyzed": 5,
-                "errorCount": 1,
-                "warningCount": 1,
-                "informationCount": 0,
-                "timeInSec": 2.5
-            }
-        }
-        
-        result = transform_pyright_output(raw_output)
+        result = transform_pyright_output(complete_raw)
         
         assert isinstance(result, PyrightResult)
         assert result.version == "1.1.300"
@@ -63,6 +60,10 @@ class TestServerTransform:
         assert diag.message == "Type mismatch"
         assert diag.rule == "reportGeneralTypeIssues"
         assert diag.range.start["line"] == 10
+        assert diag.range.model_dump() == {
+            "start": {"line": 10, "character": 5},
+            "end": {"line": 10, "character": 15},
+        }
     
     def test_transform_pyright_output_minimal(self):
         """Test transformation with minimal output."""
@@ -102,15 +103,14 @@ class TestServerTransform:
         assert result.diagnostics[0].file == "/path/to/file.py"
 
 
-@pytest.mark.asyncio
 class TestServerTools:
     """Test MCP tool implementations."""
     
     @patch("pyright_mcp.server.execute_pyright")
-    @patch("pyright_mcp.server.find_python_files")
-    async def test_check_python_types_success(self, mock_find_files, mock_execute):
+    @patch("pyright_mcp.server.find_pyright_sources")
+    async def test_check_python_types_success(self, mock_sources, mock_execute, ctx, make_path):
         """Test successful type checking."""
-        mock_find_files.return_value = ["file1.py", "file2.py"]
+        mock_sources.return_value = ["/app/code/file1.py", "/app/code/file2.py"]
         mock_execute.return_value = {
             "generalDiagnostics": [],
             "summary": {
@@ -122,191 +122,319 @@ class TestServerTools:
             }
         }
         
-        ctx = AsyncMock()
-        
-        with patch("pyright_mcp.server.Path") as mock_path:
-            mock_dir = MagicMock()
-            mock_dir.resolve.return_value = mock_dir
-            mock_dir.exists.return_value = True
-            mock_dir.is_file.return_value = False
-            mock_path.return_value = mock_dir
-            
-            result = await check_python_types(
-                ctx=ctx,
-                severity_level="warning"
-            )
+        make_path()
+        
+        result = await check_python_types(
+            ctx=ctx,
+            severity_level="warning"
+        )
         
-            assert isinstance(result, PyrightResult)
-            assert result.summary.filesAnalyzed == 2
-            
-            # Check context calls
-            ctx.info.assert_called()
-            ctx.report_progress.assert_called()
+        assert isinstance(result, PyrightResult)
+        assert result.summary.filesAnalyzed == 2
+        
+        # Check context calls
+        ctx.info.assert_called()
+        ctx.report_progress.assert_called()
     
-    @patch("pyright_mcp.server.find_python_files")
+    @patch("pyright_mcp.server.find_pyright_sources")
     @patch("pyright_mcp.server.execute_pyright")
-    async def test_check_python_types_single_file(self, mock_execute, mock_find_files):
-        """Test checking a single Python file."""
-        mock_find_files.return_value = ["/app/code/app.py"]
+    async def test_check_python_types_runs_on_project_root(self, mock_execute, mock_sources, ctx, make_path):
+        """Test Pyright runs once on /app/code at the default severity."""
+        mock_sources.return_value = ["/app/code/app.py"]
         mock_execute.return_value = {
             "generalDiagnostics": [],
             "summary": {"filesAnalyzed": 1}
         }
         
-        ctx = AsyncMock()
-        
-        with patch("pyright_mcp.server.Path") as mock_path:
-            mock_file = MagicMock()
-            mock_file.resolve.return_value = mock_file
-            mock_file.exists.return_value = True
-            mock_file.is_file.return_value = True
-            mock_file.suffix = ".py"
-            mock_file.parent = "/test"
-            mock_file.__str__ = MagicMock(return_value="/app/code")
-            mock_path.return_value = mock_file
-            
-            result = await check_python_types(
+        make_path()
+        
+        result = await check_python_types(
+            ctx=ctx
+        )
+        
+        assert isinstance(result, PyrightResult)
+        mock_execute.assert_called_once()
+        assert mock_execute.call_args.args == ("/app/code", "error")
+    
+    @patch("pyright_mcp.server.execute_pyright")
+    @patch("pyright_mcp.server.find_pyright_sources")
+    async def test_check_python_types_discovers_off_event_loop(self, mock_sources, mock_execute, ctx, make_path):
+        """Test the source walk doesn't run on the event loop's thread."""
+        loop_thread = threading.get_ident()
+        walk_threads = []
+        
+        def walk(project_path):
+            walk_threads.append(threading.get_ident())
+            return ["/app/code/app.py"]
+        
+        mock_sources.side_effect = walk
+        mock_execute.return_value = {"generalDiagnostics": [], "summary": {}}
+        make_path()
+        
+        await check_python_types(ctx=ctx)
+        
+        assert walk_threads and walk_threads[0] != loop_thread
+    
+    @patch("pyright_mcp.server.execute_pyright")
+    async def test_check_python_types_reuses_results(self, mock_execute, ctx, project_dir):
+        """Test an unchanged project isn't checked twice."""
+        (project_dir / "app.py").write_text("x: int = 1\n")
+        mock_execute.return_value = {
+            "generalDiagnostics": [],
+            "summary": {"filesAnalyzed": 1}
+        }
+        
+        await check_python_types(ctx=ctx)
+        result = await check_python_types(ctx=ctx)
+        
+        mock_execute.assert_called_once()
+        assert result.summary.filesAnalyzed == 1
+        ctx.report_progress.assert_any_call(
+            0.3, 1.0, "No changes since last run, reusing Pyright results"
+        )
+    
+    @patch("pyright_mcp.server.execute_pyright")
+    async def test_check_python_types_reruns_after_change(self, mock_execute, ctx, project_dir):
+        """Test edits Pyright would see invalidate cached results, even in ignored files."""
+        (project_dir / "main.py").write_text("from generated import api_pb2\n")
+        (project_dir / "build").mkdir()
+        (project_dir / "build" / "helper.py").write_text("")
+        (project_dir / "generated").mkdir()
+        (project_dir / "generated" / "api_pb2.py").write_text("")
+        (project_dir / ".gitignore").write_text("generated/\n")
+        mock_execute.return_value = {
+            "generalDiagnostics": [],
+            "summary": {"filesAnalyzed": 3}
+        }
+        
+        def touch(path):
+            mtime = path.stat().st_mtime_ns + 1_000_000_000
+            os.utime(path, ns=(mtime, mtime))
+        
+        await check_python_types(ctx=ctx)
+        touch(project_dir / "build" / "helper.py")
+        await check_python_types(ctx=ctx)
+        touch(project_dir / "generated" / "api_pb2.py")
+        await check_python_types(ctx=ctx)
+        (project_dir / "new.py").write_text("")
+        await check_python_types(ctx=ctx)
+        await check_python_types(ctx=ctx, severity_level="warning")
+        
+        assert mock_execute.call_count == 5
+        # The reported count still applies the default and .gitignore rules
+        ctx.info.assert_any_call("Found 1 Python files to analyze")
+    
+    @patch("pyright_mcp.server.execute_pyright")
+    async def test_check_python_types_reruns_after_environment_change(self, mock_execute, ctx, project_dir):
+        """Test installing packages or bypassing the cache forces a fresh run."""
+        (project_dir / "main.py").write_text("import requests\n")
+        site_packages = project_dir / ".venv" / "lib" / "python3.11" / "site-packages"
+        site_packages.mkdir(parents=True)
+        mock_execute.return_value = {
+            "generalDiagnostics": [],
+            "summary": {"filesAnalyzed": 1}
+        }
+        
+        await check_python_types(ctx=ctx)
+        (site_packages / "requests").mkdir()
+        mtime = site_packages.stat().st_mtime_ns + 1_000_000_000
+        os.utime(site_packages, ns=(mtime, mtime))
+        await check_python_types(ctx=ctx)
+        await check_python_types(ctx=ctx)
+        await check_python_types(ctx=ctx, use_cache=False)
+        
+        assert mock_execute.call_count == 3
+    
+    @patch("pyright_mcp.server.execute_pyright")
+    @patch("pyright_mcp.server.find_pyright_sources")
+    async def test_check_python_types_ignore_patterns_single_walk(self, mock_sources, mock_execute, ctx, project_dir):
+        """Test ignore_patterns filter the fingerprint walk instead of walking again."""
+        mock_sources.return_value = [
+            str(project_dir / "app.py"),
+            str(project_dir / "tests" / "test_app.py"),
+        ]
+        mock_execute.return_value = {
+            "generalDiagnostics": [],
+            "summary": {"filesAnalyzed": 2}
+        }
+        
+        await check_python_types(ctx=ctx, ignore_patterns=["tests/"])
+        
+        mock_sources.assert_called_once()
+        ctx.info.assert_any_call("Found 1 Python files to analyze")
+    
+    @patch("pyright_mcp.server.execute_pyright")
+    @patch("pyright_mcp.server.find_pyright_sources")
+    async def test_check_python_types_streams_progress(self, mock_sources, mock_execute, ctx, make_path):
+        """Test Pyright's stderr output is forwarded to the client."""
+        mock_sources.return_value = ["/app/code/app.py"]
+        
+        async def fake_execute(project_path, severity, on_stderr_line=None):
+            await on_stderr_line("No configuration file found.")
+            await on_stderr_line("Found 1 source file")
+            return {"generalDiagnostics": [], "summary": {"filesAnalyzed": 1}}
+        
+        mock_execute.side_effect = fake_execute
+        make_path()
+        
+        await check_python_types(ctx=ctx)
+        
+        ctx.debug.assert_any_call("No configuration file found.")
+        ctx.report_progress.assert_any_call(0.4, 1.0, "Found 1 source file")
+    
+    @patch("pyright_mcp.server.execute_pyright")
+    @patch("pyright_mcp.server.find_pyright_sources")
+    async def test_check_python_types_batches_stderr(self, mock_sources, mock_execute, ctx, make_path, monkeypatch):
+        """Test bursts of Pyright output are relayed as one message."""
+        mock_sources.return_value = ["/app/code/app.py"]
+        
+        async def fake_execute(project_path, severity, on_stderr_line=None):
+            for line in ["Loading configuration", "Checking a.py", "Checking b.py"]:
+                await on_stderr_line(line)
+            return {"generalDiagnostics": [], "summary": {"filesAnalyzed": 1}}
+        
+        mock_execute.side_effect = fake_execute
+        # Everything after the first line arrives within one flush interval
+        monkeypatch.setattr("pyright_mcp.server._STDERR_FLUSH_INTERVAL", 3600)
+        make_path()
+        
+        await check_python_types(ctx=ctx)
+        
+        ctx.debug.assert_any_call("Loading configuration")
+        ctx.debug.assert_any_call("Checking a.py\nChecking b.py")
+    
+    @patch("pyright_mcp.server.execute_pyright")
+    @patch("pyright_mcp.server.find_pyright_sources")
+    async def test_check_python_types_flushes_stderr_when_quiet(self, mock_sources, mock_execute, ctx, make_path, monkeypatch):
+        """Test buffered lines are sent once Pyright goes quiet, not when it exits."""
+        mock_sources.return_value = ["/app/code/app.py"]
+        monkeypatch.setattr("pyright_mcp.server._STDERR_FLUSH_INTERVAL", 0.05)
+        
+        async def fake_execute(project_path, severity, on_stderr_line=None):
+            for line in ["Loading configuration", "Searching for source files"]:
+                await on_stderr_line(line)
+            # Analysis runs silently for a while
+            await asyncio.sleep(0.2)
+            ctx.debug.assert_any_call("Searching for source files")
+            return {"generalDiagnostics": [], "summary": {"filesAnalyzed": 1}}
+        
+        mock_execute.side_effect = fake_execute
+        make_path()
+        
+        await check_python_types(ctx=ctx)
+        
+        assert ctx.debug.call_count == 3  # Discovery message plus both lines
+    
+    @patch("pyright_mcp.server.execute_pyright")
+    @patch("pyright_mcp.server.find_pyright_sources")
+    async def test_check_python_types_reports_flush_timer_errors(self, mock_sources, mock_execute, ctx, make_path, monkeypatch):
+        """Test a failing delayed flush fails the tool call instead of being lost."""
+        mock_sources.return_value = ["/app/code/app.py"]
+        monkeypatch.setattr("pyright_mcp.server._STDERR_FLUSH_INTERVAL", 0.05)
+        
+        async def debug(message):
+            if message == "Searching for source files":
+                raise ConnectionError("client went away")
+        
+        async def fake_execute(project_path, severity, on_stderr_line=None):
+            for line in ["Loading configuration", "Searching for source files"]:
+                await on_stderr_line(line)
+            await asyncio.sleep(0.2)
+            return {"generalDiagnostics": [], "summary": {"filesAnalyzed": 1}}
+        
+        mock_execute.side_effect = fake_execute
+        ctx.debug.side_effect = debug
+        make_path()
+        
+        with pytest.raises(ConnectionError):
+            await check_python_types(ctx=ctx)
+        
+        ctx.error.assert_called_once()
+    
+    async def test_check_python_types_not_found(self, ctx, make_path):
+        """Test error when path doesn't exist."""
+        make_path(exists=False)
+        
+        with pytest.raises(FileNotFoundError):
+            await check_python_types(
                 ctx=ctx
             )
-            
-            assert isinstance(result, PyrightResult)
-            mock_execute.assert_called_once_with("/app/code", "warning")
     
-    async def test_check_python_types_not_found(self):
-        """Test error when path doesn't exist."""
-        ctx = AsyncMock()
-        
-        with patch("pyright_mcp.server.Path") as mock_path:
-            mock_file = MagicMock()
-            mock_file.resolve.return_value = mock_file
-            mock_file.exists.return_value = False
-            mock_path.return_value = mock_file
-            
-            with pytest.raises(FileNotFoundError):
-                await check_python_types(
-                    ctx=ctx
-                )
+    async def test_check_python_types_output_schema(self):
+        """Test the published range schema matches the serialized payload."""
+        tools = {tool.name: tool for tool in await mcp.list_tools()}
+        schema = tools["check_python_types"].outputSchema["$defs"]["DiagnosticRange"]
+        payload = DiagnosticRange(start={"line": 1, "character": 2}, end={"line": 3, "character": 4})
+        
+        assert set(schema["properties"]) == {"start", "end"}
+        assert schema["required"] == ["start", "end"]
+        assert set(payload.model_dump(mode="json")) == set(schema["properties"])
     
     @patch("pyright_mcp.server.find_python_files")
-    async def test_list_python_files_directory(self, mock_find_files):
+    async def test_list_python_files_directory(self, mock_find_files, ctx, make_path):
         """Test listing Python files in directory."""
         mock_find_files.return_value = [
             "/test/file1.py",
             "/test/file2.py"
         ]
         
-        ctx = AsyncMock()
-        
-        with patch("pyright_mcp.server.Path") as mock_path:
-            mock_dir = MagicMock()
-            mock_dir.resolve.return_value = mock_dir
-            mock_dir.exists.return_value = True
-            mock_dir.is_file.return_value = False
-            mock_dir.__str__ = MagicMock(return_value="/app/code")  # Make sure this returns the expected path
-            mock_path.return_value = mock_dir
-            
-            files = await list_python_files(
-                ctx=ctx
-            )
-            
-            assert len(files) == 2
-            assert "/test/file1.py" in files
-            mock_find_files.assert_called_once_with("/app/code", None)
+        make_path()
+        
+        files = await list_python_files(
+            ctx=ctx
+        )
+        
+        assert len(files) == 2
+        assert "/test/file1.py" in files
+        mock_find_files.assert_called_once_with("/app/code", None)
     
 
 
+@pytest.fixture(scope="module")
+def sample_diagnostics():
+    """25 diagnostics shared by the pagination tests, which don't mutate them."""
+    # Trusted inputs, so skip validation like _iter_diagnostics does
+    return [
+        Diagnostic.model_construct(
+            file=f"/test/file{i}.py",
+            severity="error",
+            message=f"Error {i}",
+            rule="testRule",
+            range=DiagnosticRange.model_construct(
+                start_line=i, start_char=0, end_line=i, end_char=10
+            )
+        )
+        for i in range(25)
+    ]
+
+
 class TestServerPagination:
     """Test pagination functionality."""
 
-    def test_paginate_diagnostics_basic(self):
-        """Test basic pagination of diagnostics."""
-        from pyright_mcp.models import Diagnostic, DiagnosticRange
-        
-        # Create sample diagnostics
-        diagnostics = []
-        for i in range(25):
-            diagnostic = Diagnostic(
-                file=f"/test/file{i}.py",
-                severity="error",
-                message=f"Error {i}",
-                rule="testRule",
-                range=DiagnosticRange(
-                    start={"line": i, "character": 0},
-                    end={"line": i, "character": 10}
-                )
-            )
-            diagnostics.append(diagnostic)
+    @pytest.mark.parametrize(
+        "page,expected_len,first_file,last_file,has_next,has_prev",
+        [
+            (1, 10, "/test/file0.py", "/test/file9.py", True, False),
+            (2, 10, "/test/file10.py", "/test/file19.py", True, True),
+            (3, 5, "/test/file20.py", "/test/file24.py", False, True),  # Partial last page
+        ],
+        ids=["first", "middle", "last"],
+    )
+    def test_paginate_diagnostics_pages(
+        self, sample_diagnostics, page, expected_len, first_file, last_file, has_next, has_prev
+    ):
+        """Test first, middle and last page pagination."""
+        paginated, pagination = paginate_diagnostics(sample_diagnostics, page=page, page_size=10)
         
-        # Test first page
-        paginated, pagination = paginate_diagnostics(diagnostics, page=1, page_size=10)
-        
-        assert len(paginated) == 10
-        assert pagination.current_page == 1
+        assert len(paginated) == expected_len
+        assert pagination.current_page == page
         assert pagination.total_pages == 3
         assert pagination.page_size == 10
         assert pagination.total_diagnostics == 25
-        assert pagination.has_next_page is True
-        assert pagination.has_previous_page is False
-        assert paginated[0].file == "/test/file0.py"
-        assert paginated[9].file == "/test/file9.py"
-
-    def test_paginate_diagnostics_middle_page(self):
-        """Test middle page pagination."""
-        from pyright_mcp.models import Diagnostic, DiagnosticRange
-        
-        diagnostics = []
-        for i in range(25):
-            diagnostic = Diagnostic(
-                file=f"/test/file{i}.py",
-                severity="error", 
-                message=f"Error {i}",
-                rule="testRule",
-                range=DiagnosticRange(
-                    start={"line": i, "character": 0},
-                    end={"line": i, "character": 10}
-                )
-            )
-            diagnostics.append(diagnostic)
-        
-        # Test middle page
-        paginated, pagination = paginate_diagnostics(diagnostics, page=2, page_size=10)
-        
-        assert len(paginated) == 10
-        assert pagination.current_page == 2
-        assert pagination.total_pages == 3
-        assert pagination.has_next_page is True
-        assert pagination.has_previous_page is True
-        assert paginated[0].file == "/test/file10.py"
-        assert paginated[9].file == "/test/file19.py"
-
-    def test_paginate_diagnostics_last_page(self):
-        """Test last page with partial results."""
-        from pyright_mcp.models import Diagnostic, DiagnosticRange
-        
-        diagnostics = []
-        for i in range(25):
-            diagnostic = Diagnostic(
-                file=f"/test/file{i}.py",
-                severity="error",
-                message=f"Error {i}",
-                rule="testRule",
-                range=DiagnosticRange(
-                    start={"line": i, "character": 0},
-                    end={"line": i, "character": 10}
-                )
-            )
-            diagnostics.append(diagnostic)
-        
-        # Test last page
-        paginated, pagination = paginate_diagnostics(diagnostics, page=3, page_size=10)
-        
-        assert len(paginated) == 5  # Only 5 items on last page
-        assert pagination.current_page == 3
-        assert pagination.total_pages == 3
-        assert pagination.has_next_page is False
-        assert pagination.has_previous_page is True
-        assert paginated[0].file == "/test/file20.py"
-        assert paginated[4].file == "/test/file24.py"
+        assert pagination.has_next_page is has_next
+        assert pagination.has_previous_page is has_prev
+        assert paginated[0].file == first_file
+        assert paginated[-1].file == last_file
 
     def test_paginate_diagnostics_empty(self):
         """Test pagination with empty diagnostics list."""
@@ -374,4 +502,22 @@ class TestServerPagination:
         assert result.pagination.total_pages == 2
         assert result.pagination.total_diagnostics == 3
         assert result.pagination.has_next_page is True
-        assert result.pagination.has_previous_page is False
\ No newline at end of file
+        assert result.pagination.has_previous_page is False
+
+    def test_transform_pyright_output_builds_only_requested_page(self):
+        """Test only the requested page of diagnostics is materialized."""
+        raw_output = {
+            "generalDiagnostics": [
+                {"file": f"/test/file{i}.py", "severity": "error", "message": f"Error {i}"}
+                for i in range(1000)
+            ] + [{"severity": "error", "message": "No file"}],
+            "summary": {}
+        }
+        
+        with patch.object(Diagnostic, "model_construct", wraps=Diagnostic.model_construct) as spy:
+            result = transform_pyright_output(raw_output, page=3, page_size=10)
+        
+        assert spy.call_count == 10
+        assert [d.file for d in result.diagnostics] == [f"/test/file{i}.py" for i in range(20, 30)]
+        assert result.pagination.total_diagnostics == 1000
+        assert result.pagination.total_pages == 100